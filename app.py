@@ -3,15 +3,16 @@ import pandas as pd
 import logging
 from zone_analyzer import ZoneAnalyzer
 from chart_generator import ChartGenerator
-from config import TIMEFRAMES
-import os
-from datetime import datetime
-from collections import deque
-from database import (
-    init_db, add_alert_to_db, get_alert_history,
-    add_ticker_to_watchlist, remove_ticker_from_watchlist,
-    get_watchlist, update_preferences, get_or_create_preferences
+from config import (
+    TIMEFRAMES, TIMEFRAME_SECONDS, DATA_CACHE_TTL, CHART_MAX_CANDLES,
+    ALERT_WRITE_BATCH_SIZE, FETCH_MAX_WORKERS
 )
+from datetime import datetime
+import time
+import queue
+import threading
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -26,26 +27,64 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-if 'db_initialized' not in st.session_state:
-    init_db()
-    st.session_state.db_initialized = True
-
-if 'alert_history' not in st.session_state:
-    db_alerts = get_alert_history(limit=50)
-    st.session_state.alert_history = deque([{
-        'timestamp': alert.timestamp,
-        'ticker': alert.ticker,
-        'timeframe': alert.timeframe,
-        'alert_type': alert.alert_type,
-        'zone_type': alert.zone_type,
-        'zone_price': alert.zone_price,
-        'current_price': alert.current_price,
-        'zone_touches': alert.zone_touches
-    } for alert in db_alerts], maxlen=50)
-
-if 'watchlist' not in st.session_state:
-    db_watchlist = get_watchlist()
-    st.session_state.watchlist = db_watchlist if db_watchlist else ['BTCUSDT']
+@st.cache_resource
+def get_database():
+    import database
+    database.init_db()
+    return database
+
+if 'alert_history_dirty' not in st.session_state:
+    st.session_state.alert_history_dirty = True
+
+if 'watchlist_dirty' not in st.session_state:
+    st.session_state.watchlist_dirty = True
+
+class AlertHistoryBuffer:
+    FIELDS = ('timestamp', 'ticker', 'timeframe', 'alert_type',
+              'zone_type', 'zone_price', 'current_price', 'zone_touches')
+    
+    def __init__(self, maxlen=50):
+        self.maxlen = maxlen
+        self.columns = {field: [] for field in self.FIELDS}
+    
+    def __len__(self):
+        return len(self.columns['ticker'])
+    
+    def extend_from_db(self, db_alerts):
+        for alert in db_alerts[:self.maxlen - len(self)]:
+            for field in self.FIELDS:
+                self.columns[field].append(getattr(alert, field))
+    
+    def appendleft(self, record):
+        for field in self.FIELDS:
+            column = self.columns[field]
+            column.insert(0, record[field])
+            if len(column) > self.maxlen:
+                column.pop()
+    
+    def tickers(self):
+        return self.columns['ticker']
+    
+    def rows(self, filter_ticker=None):
+        rows = zip(*(self.columns[field] for field in self.FIELDS))
+        if filter_ticker is None:
+            return rows
+        return (row for row in rows if row[1] == filter_ticker)
+
+if st.session_state.alert_history_dirty:
+    st.session_state.alert_history = AlertHistoryBuffer(maxlen=50)
+    st.session_state.alert_history.extend_from_db(get_database().get_alert_history(limit=50))
+    st.session_state.hist_rev = st.session_state.get('hist_rev', 0) + 1
+    st.session_state.alert_history_dirty = False
+
+if st.session_state.watchlist_dirty:
+    db_watchlist = get_database().get_watchlist()
+    if 'watchlist' not in st.session_state and not db_watchlist:
+        # Тикер по умолчанию живёт только в сессии и в базу не пишется
+        db_watchlist = ['BTCUSDT']
+    st.session_state.watchlist = db_watchlist
+    st.session_state.watchlist_set = set(db_watchlist)
+    st.session_state.watchlist_dirty = False
 
 if 'sent_alerts' not in st.session_state:
     st.session_state.sent_alerts = {}
@@ -73,37 +112,144 @@ def get_zone_analyzer():
 def get_chart_generator():
     return ChartGenerator()
 
-def get_alert_status(current_price, zone, timeframe, ticker):
+@st.cache_resource
+def get_fetch_executor():
+    return ThreadPoolExecutor(max_workers=FETCH_MAX_WORKERS, thread_name_prefix="fetch")
+
+def _alert_writer_loop(alert_queue, add_alerts_to_db):
+    while True:
+        batch = [alert_queue.get()]
+        while len(batch) < ALERT_WRITE_BATCH_SIZE:
+            try:
+                batch.append(alert_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            add_alerts_to_db(batch)
+        except Exception as e:
+            logger.error(f"❌ Ошибка записи алертов: {e}", exc_info=True)
+        finally:
+            for _ in batch:
+                alert_queue.task_done()
+
+@st.cache_resource
+def get_alert_writer():
+    alert_queue = queue.Queue()
+    threading.Thread(target=_alert_writer_loop, args=(alert_queue, get_database().add_alerts_to_db), name="alert-writer", daemon=True).start()
+    return alert_queue
+
+def current_bar_time(timeframe):
+    bar_seconds = TIMEFRAME_SECONDS[timeframe]
+    return int(time.time()) // bar_seconds * bar_seconds
+
+class OHLCVUnavailable(Exception):
+    pass
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def cached_fetch_ohlcv(ticker, timeframe, lookback, bar_time):
+    df = get_zone_analyzer().fetch_ohlcv(ticker, timeframe, lookback)
+    if df is None:
+        # st.cache_data не кэширует исключения, поэтому следующий вызов повторит запрос
+        raise OHLCVUnavailable(ticker)
+    return df
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def cached_find_zones(df, timeframe):
+    return get_zone_analyzer().find_support_resistance_zones(df, timeframe)
+
+def chart_cache_key(df, ticker, timeframe, current_price):
+    timestamps = df['timestamp'].values
+    raw = f"{ticker}{timeframe}{timestamps[0]}{timestamps[-1]}{len(df)}{round(current_price, 6)}"
+    return hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+@st.cache_data(ttl=DATA_CACHE_TTL, show_spinner=False)
+def cached_generate_chart(chart_key, _df, ticker, timeframe, _support_zones, _resistance_zones,
+                          _peaks, _troughs, _recent_peaks, _recent_troughs, current_price):
+    return get_chart_generator().generate_chart(
+        _df, ticker, timeframe,
+        _support_zones, _resistance_zones,
+        _peaks, _troughs, _recent_peaks, _recent_troughs,
+        current_price
+    )
+
+def get_alert_statuses(current_price, support_zones, resistance_zones, timeframe, ticker):
     zone_analyzer = get_zone_analyzer()
-    alert_type, zone_key = zone_analyzer.check_price_alert(current_price, zone, timeframe)
+    zone_ids = [('support', i) for i in range(1, len(support_zones) + 1)] + \
+               [('resistance', i) for i in range(1, len(resistance_zones) + 1)]
+    zones = support_zones + resistance_zones
+    results = zone_analyzer.check_price_alerts_batch(current_price, zones, timeframe)
     
-    if alert_type and zone_key:
-        full_key = f"{ticker}_{zone_key}"
+    statuses = {}
+    for zone_id, zone, (alert_type, zone_key) in zip(zone_ids, zones, results):
+        statuses[zone_id] = alert_type
         
-        if full_key not in st.session_state.sent_alerts:
-            alert_record = {
-                'timestamp': datetime.now(),
-                'ticker': ticker,
-                'timeframe': timeframe,
-                'alert_type': alert_type,
-                'zone_type': zone['type'],
-                'zone_price': zone['price'],
-                'current_price': current_price,
-                'zone_touches': zone.get('touches', 0)
-            }
-            st.session_state.alert_history.appendleft(alert_record)
-            st.session_state.sent_alerts[full_key] = True
-            
-            add_alert_to_db(alert_record)
+        if alert_type and zone_key:
+            full_key = f"{ticker}_{zone_key}"
             
-            if alert_type == 'broken':
-                keys_to_remove = [k for k in st.session_state.sent_alerts.keys() if k.startswith(f"{ticker}_")]
-                for k in keys_to_remove:
-                    del st.session_state.sent_alerts[k]
+            if full_key not in st.session_state.sent_alerts:
+                alert_record = {
+                    'timestamp': datetime.now(),
+                    'ticker': ticker,
+                    'timeframe': timeframe,
+                    'alert_type': alert_type,
+                    'zone_type': zone['type'],
+                    'zone_price': zone['price'],
+                    'current_price': current_price,
+                    'zone_touches': zone.get('touches', 0)
+                }
+                st.session_state.alert_history.appendleft(alert_record)
+                st.session_state.hist_rev += 1
+                st.session_state.sent_alerts[full_key] = True
+                
+                get_alert_writer().put(alert_record)
+                
+                if alert_type == 'broken':
+                    keys_to_remove = [k for k in st.session_state.sent_alerts.keys() if k.startswith(f"{ticker}_")]
+                    for k in keys_to_remove:
+                        del st.session_state.sent_alerts[k]
     
-    return alert_type
+    return statuses
 
-def display_alert_badge(alert_type, zone_type):
+ALERT_TYPE_MAP = {
+    'approaching': ('🔔', 'ПРИБЛИЖЕНИЕ', '#FFA500'),
+    'in_zone': ('🎯', 'В ЗОНЕ', '#FFFF00'),
+    'broken': ('💥', 'ПРОБИТА', '#FF0000')
+}
+
+def _history_row_html(timestamp, ticker, timeframe, alert_type, zone_type, zone_price, current_price, zone_touches):
+    emoji, text, color = ALERT_TYPE_MAP.get(alert_type, ('❓', 'НЕИЗВЕСТНО', '#888'))
+    zone_emoji = '🟢' if zone_type == 'support' else '🔴'
+    return f"""
+    <div style='background: #1e2127; border-left: 4px solid {color}; padding: 10px; border-radius: 5px; margin: 5px 0;'>
+        <div style='display: flex; justify-content: space-between; align-items: center;'>
+            <div>
+                <span style='font-size: 18px;'>{emoji}</span>
+                <strong style='color: {color};'> {text}</strong>
+                <span style='margin-left: 10px;'>{zone_emoji} {ticker} - {timeframe.upper()}</span>
+            </div>
+            <span style='color: #888; font-size: 12px;'>{timestamp.strftime('%H:%M:%S')}</span>
+        </div>
+        <div style='margin-top: 5px; font-size: 13px; color: #CCC;'>
+            Зона: ${zone_price:,.6f} | Цена: ${current_price:,.6f} | Касаний: {zone_touches}
+        </div>
+    </div>
+    """
+
+def get_history_tickers():
+    if st.session_state.get('history_tickers_rev') != st.session_state.hist_rev:
+        st.session_state.history_tickers = sorted(set(st.session_state.alert_history.tickers()))
+        st.session_state.history_tickers_rev = st.session_state.hist_rev
+    return st.session_state.history_tickers
+
+def get_history_html(filter_ticker):
+    key = (st.session_state.hist_rev, filter_ticker)
+    if st.session_state.get('history_html_key') != key:
+        rows = st.session_state.alert_history.rows(None if filter_ticker == 'Все' else filter_ticker)
+        st.session_state.history_html = "".join(_history_row_html(*row) for row in rows)
+        st.session_state.history_html_key = key
+    return st.session_state.history_html
+
+def _make_badge(alert_type, zone_type):
     if alert_type == 'approaching':
         emoji = "🔔"
         color = "#FFA500"
@@ -136,6 +282,34 @@ def display_alert_badge(alert_type, zone_type):
     </div>
     """
 
+BADGE_HTML = {
+    (alert_type, zone_type): _make_badge(alert_type, zone_type)
+    for alert_type in ('approaching', 'in_zone', 'broken')
+    for zone_type in ('support', 'resistance')
+}
+
+def display_alert_badge(alert_type, zone_type):
+    return BADGE_HTML.get((alert_type, zone_type))
+
+NO_ALERT_HTML = (
+    "<div style='background: rgba(28, 131, 225, 0.1); color: #C7EBFF; "
+    "padding: 10px; border-radius: 5px; margin: 5px 0;'>Нет алерта</div>"
+)
+
+def _zone_row_html(label, zone, alert_type, zone_type):
+    status_html = display_alert_badge(alert_type, zone_type) if alert_type else NO_ALERT_HTML
+    return (
+        "<div style='display: grid; grid-template-columns: 3fr 1fr; gap: 16px; align-items: center; "
+        "padding: 8px 0; border-bottom: 1px solid #333;'>\n"
+        "<div>\n"
+        f"<strong>{label}: ${zone['price_str']}</strong>\n"
+        f"<div style='color: #888; font-size: 14px;'>Диапазон: ${zone['min_str']} - ${zone['max_str']}</div>\n"
+        f"<div style='color: #888; font-size: 14px;'>Касаний: {zone['touches']}</div>\n"
+        "</div>\n"
+        f"<div>{(status_html or '').strip()}</div>\n"
+        "</div>"
+    )
+
 st.title("📊 Crypto Zone Alert System")
 st.markdown("Анализ зон поддержки и сопротивления с трёхуровневой системой алертов")
 
@@ -143,19 +317,19 @@ with st.sidebar:
     st.header("⚙️ Настройки")
     
     st.subheader("📋 Watchlist")
-    new_ticker = st.text_input("Добавить тикер", placeholder="ETHUSDT", key="new_ticker_input")
+    new_ticker = st.text_input("Добавить тикер", placeholder="ETHUSDT", key="new_ticker_input").upper()
     col1, col2 = st.columns(2)
     with col1:
         if st.button("➕ Добавить", use_container_width=True):
-            if new_ticker and new_ticker.upper() not in st.session_state.watchlist:
-                st.session_state.watchlist.append(new_ticker.upper())
-                add_ticker_to_watchlist(new_ticker.upper())
+            if new_ticker and new_ticker not in st.session_state.watchlist_set:
+                get_database().add_ticker_to_watchlist(new_ticker)
+                st.session_state.watchlist_dirty = True
                 st.rerun()
     with col2:
         if st.button("🗑️ Очистить все", use_container_width=True):
             for ticker in st.session_state.watchlist:
-                remove_ticker_from_watchlist(ticker)
-            st.session_state.watchlist = []
+                get_database().remove_ticker_from_watchlist(ticker)
+            st.session_state.watchlist_dirty = True
             st.rerun()
     
     if st.session_state.watchlist:
@@ -167,8 +341,8 @@ with st.sidebar:
         ticker_input = selected_ticker
         
         if st.button(f"❌ Удалить {selected_ticker}", use_container_width=True):
-            st.session_state.watchlist.remove(selected_ticker)
-            remove_ticker_from_watchlist(selected_ticker)
+            get_database().remove_ticker_from_watchlist(selected_ticker)
+            st.session_state.watchlist_dirty = True
             st.rerun()
     else:
         ticker_input = st.text_input(
@@ -196,32 +370,157 @@ with st.sidebar:
     )
     
     auto_refresh = st.checkbox("Автообновление", value=False)
+    refresh_interval = None
     if auto_refresh:
         st.info("Обновление каждые 60 секунд")
-        refresh_interval = 60
+        refresh_interval = DATA_CACHE_TTL
     
     analyze_button = st.button("🔍 Анализировать", use_container_width=True, type="primary")
+    scan_button = st.button(
+        "📡 Сканировать watchlist",
+        use_container_width=True,
+        disabled=not st.session_state.watchlist
+    )
 
-if analyze_button or auto_refresh:
+@st.fragment
+def render_chart(chart_df, ticker_input, timeframe, support_zones, resistance_zones,
+                 peaks, troughs, recent_peaks, recent_troughs, current_price):
+    png_bytes = cached_generate_chart(
+        chart_cache_key(chart_df, ticker_input, timeframe, current_price),
+        chart_df, ticker_input, timeframe, 
+        support_zones, resistance_zones,
+        peaks, troughs, recent_peaks, recent_troughs,
+        current_price
+    )
+    
+    if png_bytes:
+        st.image(png_bytes, use_container_width=True)
+    else:
+        st.error("❌ Не удалось создать график")
+
+@st.fragment
+def render_current_alerts(support_zones, resistance_zones, alert_statuses):
+    sections = []
+    
+    if support_zones:
+        rows = "\n".join(
+            _zone_row_html(f"S{i}", zone, alert_statuses[('support', i)], 'support')
+            for i, zone in enumerate(support_zones[:3], 1)
+        )
+        sections.append(f"### 🟢 Зоны поддержки\n{rows}")
+    
+    if resistance_zones:
+        rows = "\n".join(
+            _zone_row_html(f"R{i}", zone, alert_statuses[('resistance', i)], 'resistance')
+            for i, zone in enumerate(resistance_zones[:3], 1)
+        )
+        sections.append(f"### 🔴 Зоны сопротивления\n{rows}")
+    
+    if sections:
+        st.markdown("\n\n".join(sections), unsafe_allow_html=True)
+
+@st.fragment
+def render_history():
+    st.markdown("### 📜 История алертов")
+    
+    if st.session_state.alert_history:
+        filter_ticker = st.selectbox(
+            "Фильтр по тикеру",
+            options=['Все'] + get_history_tickers(),
+            key="history_filter"
+        )
+        
+        st.markdown(get_history_html(filter_ticker), unsafe_allow_html=True)
+    else:
+        st.info("История алертов пуста. Алерты будут появляться здесь по мере их возникновения.")
+
+def render_alert_info():
+    st.divider()
+    st.subheader("ℹ️ Информация о системе алертов")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        st.markdown("""
+            **🔔 ПРИБЛИЖЕНИЕ К ЗОНЕ**
+            - Цена в пределах 2% от зоны
+            - Подготовка к действию
+            - Следите за развитием
+        """)
+    
+    with col2:
+        st.markdown("""
+            **🎯 ВХОД В ЗОНУ**
+            - Цена внутри зоны
+            - Время для действия
+            - Возможен отскок или пробой
+        """)
+    
+    with col3:
+        st.markdown("""
+            **💥 ПРОБИТИЕ ЗОНЫ**
+            - Зона пробита
+            - Сильное движение
+            - Новый уровень поддержки/сопротивления
+        """)
+
+def render_watchlist_scan(tickers, timeframe, lookback):
+    with st.spinner(f"Сканирование {len(tickers)} тикеров на {timeframe}..."):
+        analyses = get_zone_analyzer().analyze_symbols(tickers, timeframe, lookback, get_fetch_executor())
+    
+    rows = []
+    for ticker in tickers:
+        df, analysis = analyses.get(ticker, (None, None))
+        if df is None or len(df) < 20:
+            rows.append({'Тикер': ticker, 'Цена': '—', 'Поддержка': 0, 'Сопротивление': 0, 'Алерты': '❌ Нет данных'})
+            continue
+        
+        support_zones, resistance_zones, *_ = analysis
+        current_price = float(df['close'].values[-1])
+        # Только отображение: статусы не записываются в историю и не трогают sent_alerts
+        zones = support_zones[:3] + resistance_zones[:3]
+        zone_ids = [('support', i) for i in range(1, len(support_zones[:3]) + 1)] + \
+                   [('resistance', i) for i in range(1, len(resistance_zones[:3]) + 1)]
+        results = get_zone_analyzer().check_price_alerts_batch(current_price, zones, timeframe)
+        alerts = [
+            f"{ALERT_TYPE_MAP[alert_type][0]} {zone_type[0].upper()}{i}"
+            for (zone_type, i), (alert_type, _) in zip(zone_ids, results) if alert_type
+        ]
+        rows.append({
+            'Тикер': ticker,
+            'Цена': f"${current_price:,.6f}",
+            'Поддержка': len(support_zones),
+            'Сопротивление': len(resistance_zones),
+            'Алерты': ' '.join(alerts) if alerts else '—'
+        })
+    
+    st.subheader(f"📡 Сканирование watchlist ({timeframe})")
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    st.divider()
+
+def render_analysis(ticker_input, timeframe, lookback):
     with st.spinner(f"Загрузка данных {ticker_input} на {timeframe}..."):
         zone_analyzer = get_zone_analyzer()
-        chart_generator = get_chart_generator()
         
         try:
-            df = zone_analyzer.fetch_ohlcv(ticker_input, timeframe, lookback)
+            price_future = get_fetch_executor().submit(zone_analyzer.get_current_price, ticker_input)
+            try:
+                df = cached_fetch_ohlcv(ticker_input, timeframe, lookback, current_bar_time(timeframe))
+            except OHLCVUnavailable:
+                df = None
             
             if df is None or len(df) < 20:
                 st.error(f"❌ Не удалось получить данные для {ticker_input} на {timeframe}")
                 st.stop()
             
-            current_price = zone_analyzer.get_current_price(ticker_input)
+            current_price = price_future.result()
             
             if current_price is None:
                 st.error("❌ Не удалось получить текущую цену")
                 st.stop()
             
             support_zones, resistance_zones, peaks, troughs, recent_peaks, recent_troughs = \
-                zone_analyzer.find_support_resistance_zones(df, timeframe)
+                cached_find_zones(df, timeframe)
             
             col1, col2, col3, col4 = st.columns(4)
             
@@ -236,117 +535,32 @@ if analyze_button or auto_refresh:
             
             st.divider()
             
-            chart_file = f"chart_{ticker_input}_{timeframe}_{datetime.now().timestamp()}.png"
-            chart_path = chart_generator.generate_chart(
-                df, ticker_input, timeframe, 
+            chart_df = zone_analyzer.downsample_ohlcv(
+                df, CHART_MAX_CANDLES,
+                keep_timestamps=[ts for ts, _ in peaks] + [ts for ts, _ in troughs]
+            )
+            render_chart(
+                chart_df, ticker_input, timeframe,
                 support_zones, resistance_zones,
                 peaks, troughs, recent_peaks, recent_troughs,
-                current_price, chart_file
+                current_price
             )
             
-            if chart_path and os.path.exists(chart_path):
-                st.image(chart_path, use_container_width=True)
-                try:
-                    os.remove(chart_path)
-                except:
-                    pass
-            else:
-                st.error("❌ Не удалось создать график")
-            
             st.divider()
             st.subheader("🚨 Статус алертов")
             
-            alerts_found = False
+            alert_statuses = get_alert_statuses(
+                current_price, support_zones[:3], resistance_zones[:3], timeframe, ticker_input
+            )
+            alerts_found = any(alert_statuses.values())
             
             tabs = st.tabs(["🚨 Текущие алерты", "📜 История алертов"])
             
             with tabs[0]:
-                if support_zones:
-                    st.markdown("### 🟢 Зоны поддержки")
-                    for i, zone in enumerate(support_zones[:3], 1):
-                        alert_type = get_alert_status(current_price, zone, timeframe, ticker_input)
-                        
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.markdown(f"**S{i}: ${zone['price']:,.6f}**")
-                            st.caption(f"Диапазон: ${zone['min_price']:,.6f} - ${zone['max_price']:,.6f}")
-                            st.caption(f"Касаний: {zone['touches']}")
-                        
-                        with col2:
-                            if alert_type:
-                                alert_html = display_alert_badge(alert_type, 'support')
-                                if alert_html:
-                                    st.markdown(alert_html, unsafe_allow_html=True)
-                                    alerts_found = True
-                            else:
-                                st.info("Нет алерта")
-                        
-                        st.divider()
-                
-                if resistance_zones:
-                    st.markdown("### 🔴 Зоны сопротивления")
-                    for i, zone in enumerate(resistance_zones[:3], 1):
-                        alert_type = get_alert_status(current_price, zone, timeframe, ticker_input)
-                        
-                        col1, col2 = st.columns([3, 1])
-                        
-                        with col1:
-                            st.markdown(f"**R{i}: ${zone['price']:,.6f}**")
-                            st.caption(f"Диапазон: ${zone['min_price']:,.6f} - ${zone['max_price']:,.6f}")
-                            st.caption(f"Касаний: {zone['touches']}")
-                        
-                        with col2:
-                            if alert_type:
-                                alert_html = display_alert_badge(alert_type, 'resistance')
-                                if alert_html:
-                                    st.markdown(alert_html, unsafe_allow_html=True)
-                                    alerts_found = True
-                            else:
-                                st.info("Нет алерта")
-                        
-                        st.divider()
+                render_current_alerts(support_zones, resistance_zones, alert_statuses)
             
             with tabs[1]:
-                st.markdown("### 📜 История алертов")
-                
-                if st.session_state.alert_history:
-                    filter_ticker = st.selectbox(
-                        "Фильтр по тикеру",
-                        options=['Все'] + list(set(alert['ticker'] for alert in st.session_state.alert_history)),
-                        key="history_filter"
-                    )
-                    
-                    filtered_alerts = st.session_state.alert_history
-                    if filter_ticker != 'Все':
-                        filtered_alerts = [a for a in st.session_state.alert_history if a['ticker'] == filter_ticker]
-                    
-                    for alert in filtered_alerts:
-                        alert_type_map = {
-                            'approaching': ('🔔', 'ПРИБЛИЖЕНИЕ', '#FFA500'),
-                            'in_zone': ('🎯', 'В ЗОНЕ', '#FFFF00'),
-                            'broken': ('💥', 'ПРОБИТА', '#FF0000')
-                        }
-                        emoji, text, color = alert_type_map.get(alert['alert_type'], ('❓', 'НЕИЗВЕСТНО', '#888'))
-                        zone_emoji = '🟢' if alert['zone_type'] == 'support' else '🔴'
-                        
-                        st.markdown(f"""
-                        <div style='background: #1e2127; border-left: 4px solid {color}; padding: 10px; border-radius: 5px; margin: 5px 0;'>
-                            <div style='display: flex; justify-content: space-between; align-items: center;'>
-                                <div>
-                                    <span style='font-size: 18px;'>{emoji}</span>
-                                    <strong style='color: {color};'> {text}</strong>
-                                    <span style='margin-left: 10px;'>{zone_emoji} {alert['ticker']} - {alert['timeframe'].upper()}</span>
-                                </div>
-                                <span style='color: #888; font-size: 12px;'>{alert['timestamp'].strftime('%H:%M:%S')}</span>
-                            </div>
-                            <div style='margin-top: 5px; font-size: 13px; color: #CCC;'>
-                                Зона: ${alert['zone_price']:,.6f} | Цена: ${alert['current_price']:,.6f} | Касаний: {alert['zone_touches']}
-                            </div>
-                        </div>
-                        """, unsafe_allow_html=True)
-                else:
-                    st.info("История алертов пуста. Алерты будут появляться здесь по мере их возникновения.")
+                render_history()
             
             if not alerts_found and (support_zones or resistance_zones):
                 st.info("ℹ️ Нет активных алертов. Цена находится вне критических зон.")
@@ -354,43 +568,16 @@ if analyze_button or auto_refresh:
             if not support_zones and not resistance_zones:
                 st.warning("⚠️ Зоны не найдены. Попробуйте увеличить количество свечей.")
             
-            st.divider()
-            st.subheader("ℹ️ Информация о системе алертов")
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.markdown("""
-                    **🔔 ПРИБЛИЖЕНИЕ К ЗОНЕ**
-                    - Цена в пределах 2% от зоны
-                    - Подготовка к действию
-                    - Следите за развитием
-                """)
-            
-            with col2:
-                st.markdown("""
-                    **🎯 ВХОД В ЗОНУ**
-                    - Цена внутри зоны
-                    - Время для действия
-                    - Возможен отскок или пробой
-                """)
-            
-            with col3:
-                st.markdown("""
-                    **💥 ПРОБИТИЕ ЗОНЫ**
-                    - Зона пробита
-                    - Сильное движение
-                    - Новый уровень поддержки/сопротивления
-                """)
-            
-            if auto_refresh:
-                import time
-                time.sleep(refresh_interval)
-                st.rerun()
-                
         except Exception as e:
             st.error(f"❌ Ошибка: {str(e)}")
             logger.error(f"Ошибка анализа: {e}", exc_info=True)
+
+if scan_button:
+    render_watchlist_scan(st.session_state.watchlist, timeframe, lookback)
+
+if analyze_button or auto_refresh:
+    st.fragment(run_every=refresh_interval)(render_analysis)(ticker_input, timeframe, lookback)
+    render_alert_info()
 else:
     st.info("👈 Выберите настройки на боковой панели и нажмите 'Анализировать'")
     
@@ -3,84 +3,233 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import mplfinance as mpf
 import pandas as pd
-from typing import List, Dict, Tuple, Optional
+from typing import List, Dict, Tuple, Optional, BinaryIO
 from config import *
 import numpy as np
 import logging
 from PIL import Image
 import io
-import os
 
 logger = logging.getLogger(__name__)
 
+_MARKET_COLORS = mpf.make_marketcolors(
+    up='#00FF00',
+    down='#FF0000',
+    edge='inherit',
+    wick='inherit',
+    volume='inherit',
+)
+
+def _create_custom_style():
+    return mpf.make_mpf_style(
+        base_mpf_style='nightclouds',
+        rc={
+            'figure.facecolor': '#000000',
+            'axes.facecolor': '#000000',
+            'axes.edgecolor': '#333333',
+            'axes.labelcolor': '#CCCCCC',
+            'xtick.color': '#CCCCCC',
+            'ytick.color': '#CCCCCC',
+            'grid.color': '#333333',
+            'grid.alpha': 0.3,
+            'font.size': 9,
+        },
+        marketcolors=_MARKET_COLORS
+    )
+
+_STYLE = _create_custom_style()
+
+_PLOT_KWARGS = dict(
+    type='candle',
+    volume=True,
+    figsize=CHART_FIGSIZE,
+    warn_too_much_data=CHART_BUCKET_LIMIT + 1,
+    returnfig=True
+)
+
 class ChartGenerator:
+    style = _STYLE
+
     def __init__(self):
-        self.style = self._create_custom_style()
         self.max_width = 1920
         self.max_height = 1080
         self.max_file_size = 10 * 1024 * 1024
         Image.MAX_IMAGE_PIXELS = None
 
-    def _create_custom_style(self):
-        return mpf.make_mpf_style(
-            base_mpf_style='nightclouds',
-            rc={
-                'figure.facecolor': '#000000',
-                'axes.facecolor': '#000000',
-                'axes.edgecolor': '#333333',
-                'axes.labelcolor': '#CCCCCC',
-                'xtick.color': '#CCCCCC',
-                'ytick.color': '#CCCCCC',
-                'grid.color': '#333333',
-                'grid.alpha': 0.3,
-                'font.size': 9,
-            },
-            marketcolors=mpf.make_marketcolors(
-                up='#00FF00',
-                down='#FF0000',
-                edge='inherit',
-                wick='inherit',
-                volume='inherit',
-            )
-        )
+    def _compress_image(self, png_bytes: bytes) -> bytes:
+        if len(png_bytes) <= self.max_file_size:
+            return png_bytes
+        
+        try:
+            with Image.open(io.BytesIO(png_bytes)) as img:
+                if img.format == 'JPEG':
+                    img.draft('RGB', (self.max_width, self.max_height))
+                
+                if img.mode not in ('RGB', 'RGBA'):
+                    img = img.convert('RGB')
+                
+                if img.width > self.max_width or img.height > self.max_height:
+                    img.thumbnail((self.max_width, self.max_height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                
+                if img.mode == 'RGBA':
+                    rgb_img = Image.new('RGB', img.size, (0, 0, 0))
+                    rgb_img.paste(img, mask=img.split()[3])
+                    img = rgb_img
+                
+                quality = 95
+                while quality >= 70:
+                    buffer = io.BytesIO()
+                    img.save(buffer, format='JPEG', quality=quality, optimize=True)
+                    if buffer.tell() <= self.max_file_size:
+                        return buffer.getvalue()
+                    quality -= 5
+                
+                return png_bytes
+        except Exception as e:
+            logger.error(f"Ошибка сжатия: {e}")
+            return png_bytes
+
+    def _zone_levels(self, zones: List[Dict], zone_width: float, zone_type: str) -> Tuple[List[float], List[float], List[float]]:
+        zones = [zone for zone in zones[:3] if isinstance(zone, dict)]
+        if not zones:
+            return [], [], []
+        
+        levels = pd.DataFrame(zones, columns=['price', 'min_price', 'max_price']).apply(pd.to_numeric, errors='coerce')
+        valid = levels.dropna()
+        if len(valid) < len(levels):
+            logger.warning(f"Invalid {zone_type} zone data skipped: {len(levels) - len(valid)}")
+        
+        prices = valid['price'].to_numpy(dtype=float)
+        min_prices = valid['min_price'].to_numpy(dtype=float)
+        max_prices = valid['max_price'].to_numpy(dtype=float)
+        flat = min_prices == max_prices
+        min_prices = np.where(flat, prices * (1 - zone_width / 2), min_prices)
+        max_prices = np.where(flat, prices * (1 + zone_width / 2), max_prices)
+        return prices.tolist(), min_prices.tolist(), max_prices.tolist()
+
+    def _bucket_ohlc(self, df_chart: pd.DataFrame, n_out: int) -> pd.DataFrame:
+        buckets = np.arange(len(df_chart)) * n_out // len(df_chart)
+        _, first_rows = np.unique(buckets, return_index=True)
+        bucketed = df_chart.groupby(buckets).agg({
+            'Open': 'first',
+            'High': 'max',
+            'Low': 'min',
+            'Close': 'last',
+            'Volume': 'sum'
+        })
+        bucketed.index = df_chart.index[first_rows]
+        logger.info(f"📉 Свечи сгруппированы: {len(df_chart)} -> {len(bucketed)}")
+        return bucketed
+
+    def _point_arrays(self, points: List[Tuple]) -> Tuple[np.ndarray, np.ndarray]:
+        times = np.fromiter((ts for ts, _ in points), dtype=np.int64, count=len(points))
+        prices = np.fromiter((price for _, price in points), dtype=float, count=len(points))
+        return times, prices
+
+    def _marker_values(self, times: np.ndarray, prices: np.ndarray, index_ms: np.ndarray, snap: bool = False) -> np.ndarray:
+        if snap:
+            positions = np.searchsorted(index_ms, times, side='right') - 1
+            found = positions >= 0
+        else:
+            positions = np.searchsorted(index_ms, times)
+            found = positions < len(index_ms)
+            found[found] = index_ms[positions[found]] == times[found]
+        values = np.full(len(index_ms), np.nan)
+        values[positions[found]] = prices[found]
+        return values
+
+    def _trendline_values(self, points: List[Tuple], index_ms: np.ndarray) -> np.ndarray:
+        (t1, p1), (t2, p2) = sorted(points[-2:], key=lambda x: x[0])
+        if t2 <= t1:
+            return np.full(len(index_ms), np.nan)
+        
+        slope = (p2 - p1) / (t2 - t1)
+        return np.where(index_ms >= t1, p1 + slope * (index_ms - t1), np.nan)
+
+    def _render_png(self, fig) -> bytes:
+        fig.set_dpi(CHART_DPI)
+        fig.canvas.draw()
+        bbox = fig.get_tightbbox(fig.canvas.get_renderer()).padded(CHART_PAD_INCHES)
+        height = fig.get_figheight()
+        box = tuple(int(round(v * CHART_DPI)) for v in (bbox.x0, height - bbox.y1, bbox.x1, height - bbox.y0))
+        
+        img = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).crop(box).convert('RGB')
+        buf = io.BytesIO()
+        img.save(buf, format='PNG', compress_level=CHART_PNG_COMPRESS_LEVEL)
+        return buf.getvalue()
+
+    def _plot_chart(self, df_chart: pd.DataFrame, symbol: str, timeframe: str, title: str,
+                    out: Optional[BinaryIO] = None, **overlays) -> Optional[bytes]:
+        overlays = {key: value for key, value in overlays.items() if value}
+        fig, axes = mpf.plot(df_chart, style=self.style, title=title, **overlays, **_PLOT_KWARGS)
+        
+        try:
+            png_bytes = self._render_png(fig)
+        finally:
+            plt.close(fig)
+        
+        if not png_bytes:
+            logger.error(f"График не создан: {symbol} {timeframe}")
+            return None
+        
+        image_bytes = self._compress_image(png_bytes)
+        if out is not None:
+            out.write(image_bytes)
+        
+        logger.info(f"✅ График создан: {symbol} {timeframe} ({len(image_bytes)} байт)")
+        return image_bytes
 
     def generate_chart(self, df: pd.DataFrame, symbol: str, timeframe: str,
                        support_zones: List[Dict], resistance_zones: List[Dict], 
                        peaks: List[Tuple], troughs: List[Tuple], 
                        recent_peaks: List[Tuple], recent_troughs: List[Tuple],
                        current_price: Optional[float] = None, 
-                       filename: str = 'chart.png') -> Optional[str]:
+                       out: Optional[BinaryIO] = None) -> Optional[bytes]:
         
         if df is None or len(df) == 0:
             logger.error("Input DataFrame is empty or None")
             return None
 
         try:
-            df_chart = df.copy()
-            df_chart['timestamp'] = pd.to_datetime(df_chart['timestamp'], unit='ms', errors='coerce')
-            
             required_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in required_columns:
-                if col not in df_chart.columns:
-                    logger.warning(f"Column {col} missing")
-                    df_chart[col] = np.random.uniform(0.1, 0.15, len(df_chart))
+            missing_columns = [col for col in required_columns if col not in df.columns]
+            if missing_columns:
+                logger.error(f"Columns missing: {missing_columns}")
+                return None
 
-            df_chart = df_chart.dropna(subset=['timestamp'] + required_columns)
+            index = pd.to_datetime(df['timestamp'].to_numpy(), unit='ms', errors='coerce')
+            df_chart = pd.DataFrame({
+                'Open': df['open'].to_numpy(),
+                'High': df['high'].to_numpy(),
+                'Low': df['low'].to_numpy(),
+                'Close': df['close'].to_numpy(),
+                'Volume': df['volume'].to_numpy()
+            }, index=index)
+            valid = index.notna() & np.isfinite(df_chart.to_numpy(dtype=float)).all(axis=1)
+            if not valid.all():
+                df_chart = df_chart[valid]
             if len(df_chart) == 0:
                 logger.error("DataFrame has no valid data after cleaning")
                 return None
 
-            df_chart.set_index('timestamp', inplace=True)
-            df_chart = df_chart.sort_index()
+            if not df_chart.index.is_monotonic_increasing:
+                df_chart = df_chart.sort_index()
 
-            df_chart = df_chart.rename(columns={
-                'open': 'Open',
-                'high': 'High',
-                'low': 'Low',
-                'close': 'Close',
-                'volume': 'Volume'
-            })
+            bucketed = len(df_chart) > CHART_BUCKET_LIMIT
+            if bucketed:
+                df_chart = self._bucket_ohlc(df_chart, CHART_BUCKET_LIMIT)
 
+            price_range = df_chart['High'].to_numpy().max() - df_chart['Low'].to_numpy().min()
+            close_mean = df_chart['Close'].to_numpy().mean()
+            natr = (price_range / close_mean) * 100 if close_mean != 0 else 0
+            title = f"{symbol} - {timeframe.upper()} (NATR: {natr:.1f}%)"
+
+            if not (support_zones or resistance_zones or peaks or troughs or recent_peaks or recent_troughs):
+                return self._plot_chart(df_chart, symbol, timeframe, title, out)
+
+            index_ms = df_chart.index.to_numpy().astype('datetime64[ms]').astype(np.int64)
+            peak_times, peak_prices = self._point_arrays(peaks)
+            trough_times, trough_prices = self._point_arrays(troughs)
             addplots = []
             fill_betweens = []
 
@@ -89,60 +238,28 @@ class ChartGenerator:
             zone_width = ZONE_WIDTH_PERCENT / 100
 
             if support_zones:
-                latest_trough_time = max([ts for ts, _ in troughs], default=df_chart.index[-1])
-                latest_trough_time = pd.to_datetime(latest_trough_time, unit='ms')
+                latest_trough_ms = trough_times.max() if len(trough_times) else index_ms[-1]
+                support_where = index_ms >= latest_trough_ms
                 
-                for zone in support_zones[:3]:
-                    if not isinstance(zone, dict) or not all(key in zone for key in ['price', 'min_price', 'max_price']):
-                        continue
-                    try:
-                        price = float(zone['price'])
-                        min_price = float(zone['min_price'])
-                        max_price = float(zone['max_price'])
-                        if min_price == max_price:
-                            min_price = price * (1 - zone_width / 2)
-                            max_price = price * (1 + zone_width / 2)
-                        hlines_values.append(price)
-                        hlines_colors.append('#00D9A3')
-                        where = df_chart.index >= latest_trough_time
-                        fill_betweens.append({
-                            'y1': min_price,
-                            'y2': max_price,
-                            'color': '#00D9A3',
-                            'alpha': 0.2,
-                            'where': where
-                        })
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid support zone data: {zone}, error: {e}")
-                        continue
+                prices, min_prices, max_prices = self._zone_levels(support_zones, zone_width, 'support')
+                hlines_values.extend(prices)
+                hlines_colors.extend(['#00D9A3'] * len(prices))
+                fill_betweens.extend(
+                    {'y1': min_price, 'y2': max_price, 'color': '#00D9A3', 'alpha': 0.2, 'where': support_where}
+                    for min_price, max_price in zip(min_prices, max_prices)
+                )
 
             if resistance_zones:
-                latest_peak_time = max([ts for ts, _ in peaks], default=df_chart.index[-1])
-                latest_peak_time = pd.to_datetime(latest_peak_time, unit='ms')
+                latest_peak_ms = peak_times.max() if len(peak_times) else index_ms[-1]
+                resistance_where = index_ms >= latest_peak_ms
                 
-                for zone in resistance_zones[:3]:
-                    if not isinstance(zone, dict) or not all(key in zone for key in ['price', 'min_price', 'max_price']):
-                        continue
-                    try:
-                        price = float(zone['price'])
-                        min_price = float(zone['min_price'])
-                        max_price = float(zone['max_price'])
-                        if min_price == max_price:
-                            min_price = price * (1 - zone_width / 2)
-                            max_price = price * (1 + zone_width / 2)
-                        hlines_values.append(price)
-                        hlines_colors.append('#EF5350')
-                        where = df_chart.index >= latest_peak_time
-                        fill_betweens.append({
-                            'y1': min_price,
-                            'y2': max_price,
-                            'color': '#EF5350',
-                            'alpha': 0.2,
-                            'where': where
-                        })
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"Invalid resistance zone data: {zone}, error: {e}")
-                        continue
+                prices, min_prices, max_prices = self._zone_levels(resistance_zones, zone_width, 'resistance')
+                hlines_values.extend(prices)
+                hlines_colors.extend(['#EF5350'] * len(prices))
+                fill_betweens.extend(
+                    {'y1': min_price, 'y2': max_price, 'color': '#EF5350', 'alpha': 0.2, 'where': resistance_where}
+                    for min_price, max_price in zip(min_prices, max_prices)
+                )
             
             hlines = None
             if hlines_values:
@@ -154,90 +271,28 @@ class ChartGenerator:
                 )
 
             if peaks:
-                peaks_data = [(pd.to_datetime(ts, unit='ms'), price) for ts, price in peaks]
-                peaks_df = pd.DataFrame(peaks_data, columns=['timestamp', 'price']).set_index('timestamp')
-                peaks_series = peaks_df['price'].reindex(df_chart.index)
-                addplots.append(mpf.make_addplot(peaks_series, type='scatter', markersize=150, marker='v', color='#FF1493', alpha=1.0))
+                peaks_values = self._marker_values(peak_times, peak_prices, index_ms, snap=bucketed)
+                addplots.append(mpf.make_addplot(peaks_values, type='scatter', markersize=150, marker='v', color='#FF1493', alpha=1.0))
 
             if troughs:
-                troughs_data = [(pd.to_datetime(ts, unit='ms'), price) for ts, price in troughs]
-                troughs_df = pd.DataFrame(troughs_data, columns=['timestamp', 'price']).set_index('timestamp')
-                troughs_series = troughs_df['price'].reindex(df_chart.index)
-                addplots.append(mpf.make_addplot(troughs_series, type='scatter', markersize=150, marker='^', color='#00D9A3', alpha=1.0))
+                troughs_values = self._marker_values(trough_times, trough_prices, index_ms, snap=bucketed)
+                addplots.append(mpf.make_addplot(troughs_values, type='scatter', markersize=150, marker='^', color='#00D9A3', alpha=1.0))
 
             if len(recent_peaks) >= 2:
-                sorted_peaks = sorted(recent_peaks[-2:], key=lambda x: x[0])
-                peak_times = [pd.to_datetime(ts, unit='ms') for ts, _ in sorted_peaks]
-                peak_prices = [price for _, price in sorted_peaks]
-                trend_df = pd.DataFrame({'price': peak_prices}, index=peak_times).sort_index()
-                last_time = df_chart.index[-1]
-                if trend_df.index[-1] < last_time:
-                    t1, t2 = trend_df.index[0], trend_df.index[-1]
-                    p1, p2 = trend_df['price'].iloc[0], trend_df['price'].iloc[-1]
-                    time_diff = (t2 - t1).total_seconds()
-                    if time_diff > 0:
-                        slope = (p2 - p1) / time_diff
-                        time_to_last = (last_time - t1).total_seconds()
-                        extended_price = p1 + slope * time_to_last
-                        trend_df = pd.concat([trend_df, pd.DataFrame({'price': [extended_price]}, index=[last_time])]).sort_index()
-                trend_series = trend_df['price'].reindex(df_chart.index, method='ffill')
-                if trend_series.notna().any():
-                    addplots.append(mpf.make_addplot(trend_series, type='line', color='#EF5350', width=1.5, alpha=0.4))
+                trend_values = self._trendline_values(recent_peaks, index_ms)
+                if not np.isnan(trend_values).all():
+                    addplots.append(mpf.make_addplot(trend_values, type='line', color='#EF5350', width=1.5, alpha=0.4))
 
             if len(recent_troughs) >= 2:
-                sorted_troughs = sorted(recent_troughs[-2:], key=lambda x: x[0])
-                trough_times = [pd.to_datetime(ts, unit='ms') for ts, _ in sorted_troughs]
-                trough_prices = [price for _, price in sorted_troughs]
-                trend_df = pd.DataFrame({'price': trough_prices}, index=trough_times).sort_index()
-                last_time = df_chart.index[-1]
-                if trend_df.index[-1] < last_time:
-                    t1, t2 = trend_df.index[0], trend_df.index[-1]
-                    p1, p2 = trend_df['price'].iloc[0], trend_df['price'].iloc[-1]
-                    time_diff = (t2 - t1).total_seconds()
-                    if time_diff > 0:
-                        slope = (p2 - p1) / time_diff
-                        time_to_last = (last_time - t1).total_seconds()
-                        extended_price = p1 + slope * time_to_last
-                        trend_df = pd.concat([trend_df, pd.DataFrame({'price': [extended_price]}, index=[last_time])]).sort_index()
-                trend_series = trend_df['price'].reindex(df_chart.index, method='ffill')
-                if trend_series.notna().any():
-                    addplots.append(mpf.make_addplot(trend_series, type='line', color='#00D9A3', width=1.5, alpha=0.4))
-
-            price_range = df_chart['High'].max() - df_chart['Low'].min()
-            natr = (price_range / df_chart['Close'].mean()) * 100 if df_chart['Close'].mean() != 0 else 0
-            title = f"{symbol} - {timeframe.upper()} (NATR: {natr:.1f}%)"
+                trend_values = self._trendline_values(recent_troughs, index_ms)
+                if not np.isnan(trend_values).all():
+                    addplots.append(mpf.make_addplot(trend_values, type='line', color='#00D9A3', width=1.5, alpha=0.4))
 
-            fig, axes = mpf.plot(
-                df_chart,
-                type='candle',
-                style=self.style,
-                volume=True,
-                addplot=addplots if addplots else None,
-                hlines=hlines,
-                fill_between=fill_betweens if fill_betweens else None,
-                figsize=(16, 9),
-                returnfig=True,
-                title=title
+            return self._plot_chart(
+                df_chart, symbol, timeframe, title, out,
+                addplot=addplots, hlines=hlines, fill_between=fill_betweens
             )
 
-            fig.savefig(
-                filename,
-                dpi=100,
-                bbox_inches='tight',
-                facecolor='#000000',
-                edgecolor='none',
-                format='png',
-                pad_inches=0.1
-            )
-            plt.close(fig)
-            
-            if not os.path.exists(filename):
-                logger.error(f"Файл не создан: {filename}")
-                return None
-            
-            logger.info(f"✅ График сохранен: {filename}")
-            return filename
-
         except Exception as e:
             logger.error(f"❌ Ошибка генерации графика: {e}", exc_info=True)
             return None
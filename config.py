@@ -18,9 +18,21 @@ TIMEFRAMES = {
     '1d': '1d'
 }
 
+TIMEFRAME_SECONDS = {
+    '5m': 300,
+    '15m': 900,
+    '1h': 3600,
+    '4h': 14400,
+    '1d': 86400
+}
+
 DEFAULT_TIMEFRAME = '5m'
 DEFAULT_LOOKBACK = 100
 
+FETCH_MAX_WORKERS = 8
+FETCH_POOL_SIZE = 16
+PRICE_CACHE_TTL = 10
+
 ZONE_TOUCH_THRESHOLD = 3
 ZONE_WIDTH_PERCENT = 0.5
 APPROACH_DISTANCE_PERCENT = 2.0
@@ -32,6 +44,13 @@ CHECK_INTERVALS = {
 
 DEFAULT_CHECK_INTERVAL = 'continuous'
 
+DATA_CACHE_TTL = CHECK_INTERVALS['continuous']
+ALERT_WRITE_BATCH_SIZE = 64
+
 CHART_STYLE = 'binance'
 CHART_DPI = 100
 CHART_FIGSIZE = (16, 9)
+CHART_PAD_INCHES = 0.1
+CHART_PNG_COMPRESS_LEVEL = 3
+CHART_MAX_CANDLES = 200
+CHART_BUCKET_LIMIT = 1000
@@ -1,31 +1,73 @@
 import json
 import os
+from contextlib import contextmanager
 from typing import Dict, List, Set
 
+def _get_database():
+    import database
+    database.init_db()
+    return database
+
 class DataManager:
     def __init__(self, data_file='user_data.json'):
         self.data_file = data_file
+        self._db = _get_database() if os.getenv('DATABASE_URL') else None
+        self._batch_depth = 0
+        self._dirty: Set[str] = set()
+        self._ticker_sets: Dict[str, Set[str]] = {}
+        self._alert_sets: Dict[str, Dict[str, Set[str]]] = {}
         self.data = self._load_data()
     
-    def _load_data(self) -> Dict:
+    def _load_file(self) -> Dict:
         if os.path.exists(self.data_file):
             try:
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    # Мигрируем старые данные - добавляем sent_alerts если его нет
-                    for user_id in data:
-                        if 'sent_alerts' not in data[user_id]:
-                            data[user_id]['sent_alerts'] = {}
-                        if 'timeframes' not in data[user_id]:
-                            data[user_id]['timeframes'] = ['5m', '15m', '1h', '4h', '1d']
-                    return data
+                with open(self.data_file, 'rb') as f:
+                    return json.loads(f.read())
             except:
                 return {}
         return {}
     
-    def _save_data(self):
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f, indent=2)
+    def _load_data(self) -> Dict:
+        if self._db is None:
+            return self._load_file()
+        # Ошибка чтения базы пробрасывается: импорт файла допустим только в пустую таблицу
+        data = self._db.load_user_states()
+        if not data:
+            # Переносим пользователей из JSON-файла в базу при первом запуске
+            data = self._load_file()
+            self._db.save_user_states(data)
+        return data
+    
+    def _save_data(self, user_id: str):
+        self._dirty.add(str(user_id))
+        if not self._batch_depth:
+            self._write_dirty()
+    
+    def _write_dirty(self):
+        if not self._dirty:
+            return
+        written = set(self._dirty)
+        if self._db is not None:
+            # Пишем только строки изменённых пользователей, а не всё состояние;
+            # при ошибке записи пользователи остаются в _dirty и уйдут со следующей записью
+            self._db.save_user_states({uid: self.data[uid] for uid in written if uid in self.data})
+        else:
+            tmp_file = self.data_file + '.tmp'
+            with open(tmp_file, 'w') as f:
+                f.write(json.dumps(self.data, separators=(',', ':')))
+            os.replace(tmp_file, self.data_file)
+        self._dirty -= written
+    
+    @contextmanager
+    def batch(self):
+        """Откладывает запись на диск до выхода из блока"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._write_dirty()
     
     def get_user_data(self, user_id: str) -> Dict:
         user_id = str(user_id)
@@ -37,20 +79,36 @@ class DataManager:
                 'zones': {},
                 'sent_alerts': {}
             }
-            self._save_data()
+            self._save_data(user_id)
         
-        # Проверяем наличие sent_alerts у существующих пользователей
-        if 'sent_alerts' not in self.data[user_id]:
-            self.data[user_id]['sent_alerts'] = {}
-            self._save_data()
+        # Мигрируем старые данные при первом обращении к пользователю
+        user_data = self.data[user_id]
+        if 'sent_alerts' not in user_data or 'timeframes' not in user_data:
+            user_data.setdefault('sent_alerts', {})
+            user_data.setdefault('timeframes', ['5m', '15m', '1h', '4h', '1d'])
+            self._save_data(user_id)
         
-        return self.data[user_id]
+        return user_data
+    
+    def _ticker_set(self, user_id: str) -> Set[str]:
+        user_id = str(user_id)
+        if user_id not in self._ticker_sets:
+            self._ticker_sets[user_id] = set(self.get_user_data(user_id)['tickers'])
+        return self._ticker_sets[user_id]
+    
+    def _alert_set(self, user_id: str, ticker: str) -> Set[str]:
+        user_alerts = self._alert_sets.setdefault(str(user_id), {})
+        if ticker not in user_alerts:
+            user_alerts[ticker] = set(self.get_user_data(user_id)['sent_alerts'].get(ticker, []))
+        return user_alerts[ticker]
     
     def add_ticker(self, user_id: str, ticker: str) -> bool:
         user_data = self.get_user_data(user_id)
         ticker = ticker.upper()
-        if ticker not in user_data['tickers']:
+        tickers = self._ticker_set(user_id)
+        if ticker not in tickers:
             user_data['tickers'].append(ticker)
+            tickers.add(ticker)
             
             # Инициализируем zones если нет
             if 'zones' not in user_data:
@@ -61,21 +119,25 @@ class DataManager:
             if 'sent_alerts' not in user_data:
                 user_data['sent_alerts'] = {}
             user_data['sent_alerts'][ticker] = []
+            self._alert_sets.get(str(user_id), {}).pop(ticker, None)
             
-            self._save_data()
+            self._save_data(user_id)
             return True
         return False
     
     def remove_ticker(self, user_id: str, ticker: str) -> bool:
         user_data = self.get_user_data(user_id)
         ticker = ticker.upper()
-        if ticker in user_data['tickers']:
+        tickers = self._ticker_set(user_id)
+        if ticker in tickers:
             user_data['tickers'].remove(ticker)
+            tickers.discard(ticker)
+            self._alert_sets.get(str(user_id), {}).pop(ticker, None)
             if ticker in user_data.get('zones', {}):
                 del user_data['zones'][ticker]
             if ticker in user_data.get('sent_alerts', {}):
                 del user_data['sent_alerts'][ticker]
-            self._save_data()
+            self._save_data(user_id)
             return True
         return False
     
@@ -85,7 +147,7 @@ class DataManager:
     def set_interval(self, user_id: str, interval: str):
         user_data = self.get_user_data(user_id)
         user_data['interval'] = interval
-        self._save_data()
+        self._save_data(user_id)
     
     def get_interval(self, user_id: str) -> str:
         return self.get_user_data(user_id)['interval']
@@ -104,7 +166,7 @@ class DataManager:
             'support': support_zones,
             'resistance': resistance_zones
         }
-        self._save_data()
+        self._save_data(user_id)
     
     def get_zones(self, user_id: str, ticker: str, timeframe: str) -> Dict:
         user_data = self.get_user_data(user_id)
@@ -117,10 +179,10 @@ class DataManager:
         ticker = ticker.upper()
         if 'sent_alerts' not in user_data:
             user_data['sent_alerts'] = {}
-            self._save_data()
+            self._save_data(user_id)
         if ticker not in user_data['sent_alerts']:
             user_data['sent_alerts'][ticker] = []
-        return zone_key in user_data['sent_alerts'][ticker]
+        return zone_key in self._alert_set(user_id, ticker)
     
     def mark_alert_sent(self, user_id: str, ticker: str, zone_key: str):
         """Отмечает что алерт для зоны отправлен"""
@@ -130,9 +192,11 @@ class DataManager:
             user_data['sent_alerts'] = {}
         if ticker not in user_data['sent_alerts']:
             user_data['sent_alerts'][ticker] = []
-        if zone_key not in user_data['sent_alerts'][ticker]:
+        sent = self._alert_set(user_id, ticker)
+        if zone_key not in sent:
             user_data['sent_alerts'][ticker].append(zone_key)
-            self._save_data()
+            sent.add(zone_key)
+            self._save_data(user_id)
     
     def reset_alerts_for_ticker(self, user_id: str, ticker: str):
         """Сброс алертов для тикера (при пробитии зоны)"""
@@ -142,7 +206,8 @@ class DataManager:
             user_data['sent_alerts'] = {}
         if ticker in user_data['sent_alerts']:
             user_data['sent_alerts'][ticker] = []
-            self._save_data()
+            self._alert_sets.get(str(user_id), {}).pop(ticker, None)
+            self._save_data(user_id)
     
     def get_all_users(self) -> List[str]:
         return list(self.data.keys())
\ No newline at end of file
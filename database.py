@@ -1,5 +1,6 @@
 import os
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, JSON, Boolean
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, Column, Integer, String, Float, DateTime, JSON, Boolean, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
@@ -9,16 +10,29 @@ logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 
-engine = create_engine(DATABASE_URL, echo=False)
+if DATABASE_URL and DATABASE_URL.startswith('sqlite'):
+    engine = create_engine(DATABASE_URL, echo=False)
+
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+else:
+    engine = create_engine(DATABASE_URL, pool_size=20, max_overflow=40, pool_pre_ping=True, echo=False)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 class AlertHistory(Base):
     __tablename__ = 'alert_history'
+    __table_args__ = (
+        Index('ix_alert_ticker_ts', 'ticker', 'timestamp'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime, default=datetime.now, index=True)
-    ticker = Column(String, index=True)
+    ticker = Column(String)
     timeframe = Column(String)
     alert_type = Column(String)
     zone_type = Column(String)
@@ -45,6 +59,13 @@ class UserPreferences(Base):
     settings = Column(JSON, default={})
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
+class UserState(Base):
+    __tablename__ = 'user_state'
+    
+    user_id = Column(String, primary_key=True)
+    data = Column(JSON, default={})
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
 def init_db():
     try:
         Base.metadata.create_all(bind=engine)
@@ -59,19 +80,36 @@ def get_db():
     finally:
         db.close()
 
-def add_alert_to_db(alert_data):
+@contextmanager
+def session_scope():
     db = SessionLocal()
     try:
-        alert = AlertHistory(**alert_data)
-        db.add(alert)
+        yield db
         db.commit()
-        logger.info(f"✅ Alert saved to database: {alert_data['ticker']} {alert_data['alert_type']}")
-    except Exception as e:
-        logger.error(f"❌ Error saving alert: {e}")
+    except Exception:
         db.rollback()
+        raise
     finally:
         db.close()
 
+def add_alert_to_db(alert_data):
+    try:
+        with engine.begin() as conn:
+            conn.execute(AlertHistory.__table__.insert(), alert_data)
+        logger.info(f"✅ Alert saved to database: {alert_data['ticker']} {alert_data['alert_type']}")
+    except Exception as e:
+        logger.error(f"❌ Error saving alert: {e}")
+
+def add_alerts_to_db(alerts):
+    if not alerts:
+        return
+    try:
+        with engine.begin() as conn:
+            conn.execute(AlertHistory.__table__.insert(), alerts)
+        logger.info(f"✅ Saved {len(alerts)} alerts to database")
+    except Exception as e:
+        logger.error(f"❌ Error saving alerts: {e}")
+
 def get_alert_history(ticker=None, limit=50):
     db = SessionLocal()
     try:
@@ -87,44 +125,35 @@ def get_alert_history(ticker=None, limit=50):
         db.close()
 
 def add_ticker_to_watchlist(ticker, user_id='default_user'):
-    db = SessionLocal()
     try:
-        existing = db.query(Watchlist).filter(
-            Watchlist.ticker == ticker,
-            Watchlist.user_id == user_id,
-            Watchlist.active == True
-        ).first()
-        
-        if not existing:
-            watchlist_item = Watchlist(ticker=ticker, user_id=user_id)
-            db.add(watchlist_item)
-            db.commit()
-            logger.info(f"✅ Added {ticker} to watchlist")
-            return True
-        return False
+        with session_scope() as db:
+            existing = db.query(Watchlist).filter(
+                Watchlist.ticker == ticker,
+                Watchlist.user_id == user_id,
+                Watchlist.active == True
+            ).first()
+            
+            if existing:
+                return False
+            db.add(Watchlist(ticker=ticker, user_id=user_id))
+        logger.info(f"✅ Added {ticker} to watchlist")
+        return True
     except Exception as e:
         logger.error(f"❌ Error adding to watchlist: {e}")
-        db.rollback()
         return False
-    finally:
-        db.close()
 
 def remove_ticker_from_watchlist(ticker, user_id='default_user'):
-    db = SessionLocal()
     try:
-        db.query(Watchlist).filter(
-            Watchlist.ticker == ticker,
-            Watchlist.user_id == user_id
-        ).update({Watchlist.active: False})
-        db.commit()
+        with session_scope() as db:
+            db.query(Watchlist).filter(
+                Watchlist.ticker == ticker,
+                Watchlist.user_id == user_id
+            ).update({Watchlist.active: False})
         logger.info(f"✅ Removed {ticker} from watchlist")
         return True
     except Exception as e:
         logger.error(f"❌ Error removing from watchlist: {e}")
-        db.rollback()
         return False
-    finally:
-        db.close()
 
 def get_watchlist(user_id='default_user'):
     db = SessionLocal()
@@ -157,26 +186,42 @@ def get_or_create_preferences(user_id='default_user'):
         db.close()
 
 def update_preferences(user_id, webhook_url=None, custom_zones=None, settings=None):
-    db = SessionLocal()
     try:
-        prefs = db.query(UserPreferences).filter(UserPreferences.user_id == user_id).first()
-        if not prefs:
-            prefs = UserPreferences(user_id=user_id)
-            db.add(prefs)
-        
-        if webhook_url is not None:
-            prefs.webhook_url = webhook_url
-        if custom_zones is not None:
-            prefs.custom_zones = custom_zones
-        if settings is not None:
-            prefs.settings = settings
-        
-        db.commit()
+        with session_scope() as db:
+            prefs = db.query(UserPreferences).filter(UserPreferences.user_id == user_id).first()
+            if not prefs:
+                prefs = UserPreferences(user_id=user_id)
+                db.add(prefs)
+            
+            if webhook_url is not None:
+                prefs.webhook_url = webhook_url
+            if custom_zones is not None:
+                prefs.custom_zones = custom_zones
+            if settings is not None:
+                prefs.settings = settings
         logger.info(f"✅ Updated preferences for {user_id}")
         return True
     except Exception as e:
         logger.error(f"❌ Error updating preferences: {e}")
-        db.rollback()
         return False
+
+def load_user_states():
+    db = SessionLocal()
+    try:
+        return {row.user_id: row.data for row in db.query(UserState).all()}
+    except Exception as e:
+        logger.error(f"❌ Error loading user states: {e}")
+        raise
     finally:
         db.close()
+
+def save_user_states(states):
+    if not states:
+        return
+    try:
+        with session_scope() as db:
+            for user_id, data in states.items():
+                db.merge(UserState(user_id=user_id, data=data))
+    except Exception as e:
+        logger.error(f"❌ Error saving user states: {e}")
+        raise
@@ -2,48 +2,82 @@ import ccxt
 import pandas as pd
 import numpy as np
 from scipy.signal import argrelextrema
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 from config import *
 import logging
 
 logger = logging.getLogger(__name__)
 
+_ZONE_HALF_WIDTH = ZONE_WIDTH_PERCENT / 100 / 2
+_APPROACH_DISTANCE = APPROACH_DISTANCE_PERCENT / 100
+
+_exchange = None
+_exchange_lock = threading.Lock()
+
+def _get_exchange():
+    global _exchange
+    if _exchange is None:
+        with _exchange_lock:
+            if _exchange is None:
+                options = {
+                    'defaultType': 'future'
+                }
+                if BINANCE_API_KEY and BINANCE_SECRET_KEY:
+                    options['apiKey'] = BINANCE_API_KEY
+                    options['secret'] = BINANCE_SECRET_KEY
+                
+                exchange = ccxt.binance(options)
+                adapter = HTTPAdapter(pool_connections=FETCH_POOL_SIZE, pool_maxsize=FETCH_POOL_SIZE)
+                exchange.session.mount('https://', adapter)
+                _exchange = exchange
+    return _exchange
+
 class ZoneAnalyzer:
+    _markets = None
+    _markets_lock = threading.Lock()
+    _normalized_symbols = {}
+
     def __init__(self):
-        options = {
-            'defaultType': 'future'
-        }
-        if BINANCE_API_KEY and BINANCE_SECRET_KEY:
-            options['apiKey'] = BINANCE_API_KEY
-            options['secret'] = BINANCE_SECRET_KEY
-        
-        self.exchange = ccxt.binance(options)
+        self.exchange = _get_exchange()
         self.markets = None
+        self._price_cache = {}
+        self._price_locks = {}
 
     def _load_markets(self):
-        if self.markets is None:
-            try:
-                self.markets = self.exchange.load_markets()
-                logger.info(f"✅ Загружено {len(self.markets)} рынков")
-            except Exception as e:
-                logger.warning(f"⚠️ Не удалось загрузить рынки: {e}")
-                self.markets = {}
+        if self.markets is not None:
+            return
+        
+        with ZoneAnalyzer._markets_lock:
+            if ZoneAnalyzer._markets is None:
+                try:
+                    ZoneAnalyzer._markets = self.exchange.load_markets()
+                    logger.info(f"✅ Загружено {len(ZoneAnalyzer._markets)} рынков")
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось загрузить рынки: {e}")
+                    ZoneAnalyzer._markets = {}
+        self.markets = ZoneAnalyzer._markets
 
     def normalize_symbol(self, symbol: str) -> str:
         self._load_markets()
-        symbol = symbol.upper().replace('/', '')
+        normalized = self._normalized_symbols.get(symbol)
+        if normalized is not None:
+            return normalized
         
-        if symbol.endswith('USDT'):
-            base = symbol[:-4]
-            normalized = f"{base}/USDT:USDT"
+        normalized = symbol.upper().replace('/', '')
+        if normalized.endswith('USDT'):
+            normalized = f"{normalized[:-4]}/USDT:USDT"
             logger.info(f"🔄 Символ {symbol} -> {normalized}")
-            return normalized
         
-        return symbol
+        self._normalized_symbols[symbol] = normalized
+        return normalized
 
     def fetch_ohlcv(self, symbol: str, timeframe: str = '5m', limit: int = 200) -> pd.DataFrame:
         try:
             symbol = self.normalize_symbol(symbol)
-            logger.info(f"📊 Запрос данных: {symbol} {timeframe} (лимит: {limit})")
+            logger.debug(f"📊 Запрос данных: {symbol} {timeframe} (лимит: {limit})")
             
             ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
             
@@ -51,39 +85,39 @@ class ZoneAnalyzer:
                 logger.error(f"❌ Пустой ответ от биржи для {symbol} {timeframe}")
                 return None
             
-            logger.info(f"✅ Получено {len(ohlcv)} свечей")
-            
-            df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            
-            df['open'] = pd.to_numeric(df['open'], errors='coerce')
-            df['high'] = pd.to_numeric(df['high'], errors='coerce')
-            df['low'] = pd.to_numeric(df['low'], errors='coerce')
-            df['close'] = pd.to_numeric(df['close'], errors='coerce')
-            df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
-            df['timestamp'] = pd.to_numeric(df['timestamp'], errors='coerce')
+            logger.debug(f"✅ Получено {len(ohlcv)} свечей")
             
-            df = df.dropna()
+            arr = np.asarray(ohlcv, dtype=np.float64)
+            finite = np.isfinite(arr).all(axis=1)
+            if not finite.all():
+                arr = arr[finite]
             
-            if len(df) == 0:
+            if len(arr) == 0:
                 logger.error(f"❌ Все данные стали NaN после конвертации")
                 return None
             
-            if df['high'].min() <= 0 or df['low'].min() <= 0:
-                logger.error(f"❌ Некорректные цены (<=0)")
-                return None
+            open_, high, low, close = arr[:, 1], arr[:, 2], arr[:, 3], arr[:, 4]
+            valid = (low > 0) & (high >= low) & (high >= open_) & (high >= close) & (low <= open_) & (low <= close)
             
-            invalid = df[(df['high'] < df['low']) | 
-                        (df['high'] < df['open']) | 
-                        (df['high'] < df['close']) |
-                        (df['low'] > df['open']) | 
-                        (df['low'] > df['close'])]
+            if not valid.all():
+                logger.warning(f"⚠️ Найдено {len(valid) - int(valid.sum())} некорректных свечей, удаляем их")
+                arr = arr[valid]
+                if len(arr) == 0:
+                    logger.error("❌ Не осталось корректных свечей")
+                    return None
             
-            if len(invalid) > 0:
-                logger.warning(f"⚠️ Найдено {len(invalid)} некорректных свечей, удаляем их")
-                df = df[~df.index.isin(invalid.index)]
+            df = pd.DataFrame({
+                'timestamp': arr[:, 0].astype(np.int64),
+                'open': arr[:, 1],
+                'high': arr[:, 2],
+                'low': arr[:, 3],
+                'close': arr[:, 4],
+                'volume': arr[:, 5]
+            })
             
             logger.info(f"✅ Итого корректных свечей: {len(df)}")
-            logger.info(f"Диапазон цен: ${df['low'].min():.6f} - ${df['high'].max():.6f}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Диапазон цен: ${df['low'].min():.6f} - ${df['high'].max():.6f}")
             
             return df
             
@@ -97,91 +131,166 @@ class ZoneAnalyzer:
             logger.error(f"❌ Неожиданная ошибка OHLCV {symbol} {timeframe}: {e}", exc_info=True)
             return None
 
+    def _map_concurrent(self, fn, items: list, executor=None) -> dict:
+        if not items:
+            return {}
+        
+        self._load_markets()
+        if executor is not None:
+            return dict(zip(items, executor.map(fn, items)))
+        with ThreadPoolExecutor(max_workers=min(FETCH_MAX_WORKERS, len(items))) as pool:
+            return dict(zip(items, pool.map(fn, items)))
+
+    def fetch_ohlcv_many(self, symbols: list, timeframe: str = '5m', limit: int = 200, executor=None) -> dict:
+        return self._map_concurrent(lambda symbol: self.fetch_ohlcv(symbol, timeframe, limit), symbols, executor)
+
+    def _analyze_symbol(self, symbol: str, timeframe: str, limit: int) -> tuple:
+        df = self.fetch_ohlcv(symbol, timeframe, limit)
+        if df is None:
+            return None, None
+        return df, self.find_support_resistance_zones(df, timeframe)
+
+    def analyze_symbols(self, symbols: list, timeframe: str = '5m', limit: int = 200, executor=None) -> dict:
+        return self._map_concurrent(lambda symbol: self._analyze_symbol(symbol, timeframe, limit), symbols, executor)
+
     def get_current_price(self, symbol: str) -> float:
         try:
             symbol = self.normalize_symbol(symbol)
-            ticker = self.exchange.fetch_ticker(symbol)
-            price = ticker['last']
+            cached = self._price_cache.get(symbol)
+            if cached and time.monotonic() - cached[1] < PRICE_CACHE_TTL:
+                return cached[0]
+            
+            with self._price_locks.setdefault(symbol, threading.Lock()):
+                cached = self._price_cache.get(symbol)
+                if cached and time.monotonic() - cached[1] < PRICE_CACHE_TTL:
+                    return cached[0]
+                
+                ticker = self.exchange.fetch_ticker(symbol)
+                price = ticker['last']
+                self._price_cache[symbol] = (price, time.monotonic())
+            
             logger.info(f"💰 Текущая цена {symbol}: ${price:.6f}")
             return price
         except Exception as e:
             logger.error(f"❌ Ошибка получения цены {symbol}: {e}")
             return None
 
-    def _find_peaks_and_troughs(self, df: pd.DataFrame, order: int = 5):
-        high = df['high'].values
-        low = df['low'].values
+    def _lttb_indices(self, values: np.ndarray, n_out: int) -> np.ndarray:
+        n = len(values)
+        if n_out >= n or n_out < 3:
+            return np.arange(n)
+        
+        x = np.arange(n, dtype=np.float64)
+        y = np.asarray(values, dtype=np.float64)
+        every = (n - 2) / (n_out - 2)
+        edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
         
+        selected = np.empty(n_out, dtype=np.int64)
+        selected[0] = 0
+        selected[-1] = n - 1
+        a = 0
+        for i in range(n_out - 2):
+            start, end = edges[i], edges[i + 1]
+            next_end = edges[i + 2] if i + 2 < len(edges) else n
+            avg_x = x[end:next_end].mean()
+            avg_y = y[end:next_end].mean()
+            area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) -
+                          (x[a] - x[start:end]) * (avg_y - y[a]))
+            a = start + int(area.argmax())
+            selected[i + 1] = a
+        
+        return selected
+
+    def downsample_ohlcv(self, df: pd.DataFrame, n_out: int = 200, keep_timestamps=None) -> pd.DataFrame:
+        if df is None or len(df) <= n_out:
+            return df
+        
+        selected = self._lttb_indices(df['high'].values, n_out)
+        if keep_timestamps:
+            keep = np.flatnonzero(np.isin(df['timestamp'].values, np.asarray(keep_timestamps)))
+            selected = np.union1d(selected, keep)
+        
+        logger.info(f"📉 Даунсэмплинг LTTB: {len(df)} -> {len(selected)} свечей")
+        return df.iloc[selected]
+
+    def _find_peaks_and_troughs(self, high: np.ndarray, low: np.ndarray, order: int = 5):
         peaks_idx = argrelextrema(high, np.greater, order=order)[0]
         troughs_idx = argrelextrema(low, np.less, order=order)[0]
         
-        peaks = [(df.iloc[i]['timestamp'], df.iloc[i]['high']) for i in peaks_idx]
-        troughs = [(df.iloc[i]['timestamp'], df.iloc[i]['low']) for i in troughs_idx]
+        logger.info(f"🔍 Найдено пиков: {len(peaks_idx)}, впадин: {len(troughs_idx)}")
         
-        logger.info(f"🔍 Найдено пиков: {len(peaks)}, впадин: {len(troughs)}")
-        
-        return peaks, troughs
+        return peaks_idx, troughs_idx
 
-    def _cluster_levels(self, levels, tolerance_percent=0.5):
-        if not levels: 
+    def _cluster_levels(self, levels, tolerance_percent=0.5, ztype=None, timeframe=None):
+        if len(levels) == 0:
             return []
         
-        levels = sorted(levels)
+        levels = np.sort(np.asarray(levels, dtype=np.float64)).tolist()
+        tolerance = tolerance_percent / 100
         zones = []
-        current = [levels[0]]
+        total = min_price = max_price = levels[0]
+        count = 1
         
+        # Центр кластера ведётся как сумма/количество, без пересчёта среднего по списку
         for level in levels[1:]:
-            center = np.mean(current)
-            if abs(level - center) / center <= tolerance_percent / 100:
-                current.append(level)
+            center = total / count
+            if abs(level - center) / center <= tolerance:
+                total += level
+                count += 1
+                max_price = level
             else:
                 zones.append({
-                    'price': np.mean(current),
-                    'touches': len(current),
-                    'min_price': min(current),
-                    'max_price': max(current)
+                    'price': total / count,
+                    'touches': count,
+                    'min_price': min_price,
+                    'max_price': max_price,
+                    'type': ztype,
+                    'timeframe': timeframe
                 })
-                current = [level]
-        
-        if current:
-            zones.append({
-                'price': np.mean(current),
-                'touches': len(current),
-                'min_price': min(current),
-                'max_price': max(current)
-            })
+                total = min_price = max_price = level
+                count = 1
+        
+        zones.append({
+            'price': total / count,
+            'touches': count,
+            'min_price': min_price,
+            'max_price': max_price,
+            'type': ztype,
+            'timeframe': timeframe
+        })
         
         return sorted(zones, key=lambda x: x['touches'], reverse=True)[:5]
 
+    def _attach_price_strings(self, zone: dict):
+        zone['price_str'] = format(zone['price'], ',.6f')
+        zone['min_str'] = format(zone['min_price'], ',.6f')
+        zone['max_str'] = format(zone['max_price'], ',.6f')
+
     def find_support_resistance_zones(self, df: pd.DataFrame, timeframe: str):
-        peaks, troughs = self._find_peaks_and_troughs(df)
+        timestamps = df['timestamp'].values
+        high = df['high'].values
+        low = df['low'].values
+        peaks_idx, troughs_idx = self._find_peaks_and_troughs(high, low)
         
-        resistance_levels = [p[1] for p in peaks]
-        support_levels = [t[1] for t in troughs]
+        resistance_levels = high[peaks_idx]
+        support_levels = low[troughs_idx]
         
-        resistance_zones = self._cluster_levels(resistance_levels, ZONE_WIDTH_PERCENT)
-        support_zones = self._cluster_levels(support_levels, ZONE_WIDTH_PERCENT)
+        resistance_zones = self._cluster_levels(resistance_levels, ZONE_WIDTH_PERCENT, 'resistance', timeframe)
+        support_zones = self._cluster_levels(support_levels, ZONE_WIDTH_PERCENT, 'support', timeframe)
         
-        recent_peaks = sorted(peaks, key=lambda x: x[0], reverse=True)[:2]
-        recent_troughs = sorted(troughs, key=lambda x: x[0], reverse=True)[:2]
-
-        current_price = df['close'].iloc[-1]
+        peaks = list(zip(timestamps[peaks_idx].tolist(), resistance_levels.tolist()))
+        troughs = list(zip(timestamps[troughs_idx].tolist(), support_levels.tolist()))
         
-        valid_support = []
-        for zone in support_zones:
-            if current_price >= zone['min_price']:
-                z = zone.copy()
-                z['type'] = 'support'
-                z['timeframe'] = timeframe
-                valid_support.append(z)
+        # Свечи приходят с биржи по возрастанию времени, поэтому самые свежие экстремумы — последние
+        recent_peaks = peaks[-2:][::-1]
+        recent_troughs = troughs[-2:][::-1]
+
+        current_price = df['close'].values[-1]
         
-        valid_resistance = []
-        for zone in resistance_zones:
-            if current_price <= zone['max_price']:
-                z = zone.copy()
-                z['type'] = 'resistance'
-                z['timeframe'] = timeframe
-                valid_resistance.append(z)
+        valid_support = [zone for zone in support_zones if current_price >= zone['min_price']]
+        valid_resistance = [zone for zone in resistance_zones if current_price <= zone['max_price']]
+        for zone in valid_support + valid_resistance:
+            self._attach_price_strings(zone)
 
         logger.info(f"✅ {timeframe}: Поддержка={len(valid_support)}, Сопротивление={len(valid_resistance)}")
         
@@ -190,11 +299,9 @@ class ZoneAnalyzer:
     def check_price_alert(self, current_price: float, zone: dict, timeframe: str) -> tuple:
         price = zone['price']
         ztype = zone['type']
-        width = ZONE_WIDTH_PERCENT / 100
-        approach = APPROACH_DISTANCE_PERCENT / 100
         
-        lower = price * (1 - width / 2)
-        upper = price * (1 + width / 2)
+        lower = price * (1 - _ZONE_HALF_WIDTH)
+        upper = price * (1 + _ZONE_HALF_WIDTH)
         
         if ztype == 'support' and current_price < lower:
             return ('broken', f"{timeframe}_{ztype}_{price:.8f}")
@@ -205,7 +312,29 @@ class ZoneAnalyzer:
             return ('in_zone', f"{timeframe}_{ztype}_{price:.8f}")
         
         dist = abs(current_price - price) / price
-        if dist <= approach:
+        if dist <= _APPROACH_DISTANCE:
             return ('approaching', f"{timeframe}_{ztype}_{price:.8f}")
         
         return (None, None)
+
+    def check_price_alerts_batch(self, current_price: float, zones: list, timeframe: str) -> list:
+        if not zones:
+            return []
+        
+        prices = np.fromiter((zone['price'] for zone in zones), dtype=np.float64, count=len(zones))
+        is_support = np.fromiter((zone['type'] == 'support' for zone in zones), dtype=bool, count=len(zones))
+        is_resistance = np.fromiter((zone['type'] == 'resistance' for zone in zones), dtype=bool, count=len(zones))
+        
+        lower = prices * (1 - _ZONE_HALF_WIDTH)
+        upper = prices * (1 + _ZONE_HALF_WIDTH)
+        
+        broken = (is_support & (current_price < lower)) | (is_resistance & (current_price > upper))
+        in_zone = (lower <= current_price) & (current_price <= upper)
+        approaching = np.abs(current_price - prices) / prices <= _APPROACH_DISTANCE
+        
+        alert_types = np.select([broken, in_zone, approaching], ['broken', 'in_zone', 'approaching'], default='')
+        
+        return [
+            (alert_type, f"{timeframe}_{zone['type']}_{zone['price']:.8f}") if alert_type else (None, None)
+            for alert_type, zone in zip(alert_types.tolist(), zones)
+        ]